@@ -1,5 +1,15 @@
+import os
+
 from prometheus_client import multiprocess
 
+# NOTE: the service is i/o bound (proxying and github api calls), so all workers
+#       are async uvicorn workers serving many concurrent requests each
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 * (os.cpu_count() or 1) + 1))
+# NOTE: keep connections from the ingress open longer than its idle timeout
+keepalive = 75
+timeout = 120
+
 
 def child_exit(server, worker):
     multiprocess.mark_process_dead(worker.pid)
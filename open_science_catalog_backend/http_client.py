@@ -0,0 +1,30 @@
+from typing import cast
+
+import httpx
+
+from open_science_catalog_backend import app
+
+# NOTE: a single client is shared by the whole application so that keep-alive
+#       connections to the catalog, the processing backends and github are
+#       reused across requests.
+_client: httpx.AsyncClient | None = None
+
+
+def client() -> httpx.AsyncClient:
+    return cast(httpx.AsyncClient, _client)
+
+
+@app.on_event("startup")
+async def _open_client() -> None:
+    global _client
+    _client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100),
+        timeout=30.0,
+    )
+
+
+@app.on_event("shutdown")
+async def _close_client() -> None:
+    if _client is not None:
+        await _client.aclose()
@@ -1,17 +1,19 @@
 from http import HTTPStatus
 import logging
-from typing import cast
+from typing import Any, cast
 from urllib.parse import urlparse
 
 from fastapi import Request, Response, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
 import httpx
-import requests
-import requests.exceptions
+import orjson
 import yaml
 
 from open_science_catalog_backend import app, config
+from open_science_catalog_backend.http_client import client
+from open_science_catalog_backend.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -19,36 +21,78 @@ ALL_METHODS = ["GET", "POST", "PUT", "DELETE", "HEAD"]
 
 URL_PREFIX = "/processing/{remote_backend}/"
 
+_EXCLUDED_RESPONSE_HEADERS = frozenset(
+    b"content-encoding content-length transfer-encoding connection".split()
+)
+
+# NOTE: upstream operations (e.g. synchronous executions or result downloads) may
+#       take arbitrarily long between bytes, so reading is not limited, just
+#       like it wasn't with `requests`
+_PROXY_TIMEOUT = httpx.Timeout(30.0, read=None)
+
+# NOTE: caches are local to each worker process, changes in the catalog are
+#       picked up once the entries expire
+_cwl_link_cache: TTLCache[str, str] = TTLCache(ttl=300, maxsize=1024)
+# NOTE: maps (remote backend, user, process) to the id of the deployed process
+_process_id_cache: TTLCache[tuple[str, str, str], str] = TTLCache(ttl=600)
+# NOTE: holds applications already converted to json
+_application_cache: TTLCache[str, bytes] = TTLCache(ttl=600, maxsize=256)
+
+# NOTE: the libyaml based loader is a lot faster, but might not be available
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# NOTE: resolved once on startup so that requests only do a dict lookup
+_BACKEND_URLS: dict[str, str] = {}
+_BACKEND_HOSTS: dict[str, str] = {}
+# NOTE: maps each proxied service prefix to its url on every remote backend
+_SERVICE_URLS: dict[str, dict[str, str]] = {}
+
+
+@app.on_event("startup")
+async def _load_remote_backends() -> None:
+    _BACKEND_URLS.clear()
+    _BACKEND_URLS.update(config.REMOTE_PROCESSING_BACKEND_MAPPING or {})
+    _BACKEND_HOSTS.clear()
+    _BACKEND_HOSTS.update(
+        {name: cast(str, urlparse(url).hostname) for name, url in _BACKEND_URLS.items()}
+    )
+    for service_prefix, service_urls in _SERVICE_URLS.items():
+        service_urls.clear()
+        service_urls.update(
+            {name: f"{url}/{service_prefix}" for name, url in _BACKEND_URLS.items()}
+        )
 
-def remote_backend_to_url(remote_backend: str) -> str:
-    mapping = cast(dict, config.REMOTE_PROCESSING_BACKEND_MAPPING)
 
+def remote_backend_to_url(remote_backend: str) -> str:
     try:
-        return mapping[remote_backend]
+        return _BACKEND_URLS[remote_backend]
     except KeyError:
-        raise HTTPException(
-            status_code=HTTPStatus.BAD_REQUEST,
-            detail=f"Invalid remote backend {remote_backend}",
-        )
+        raise _invalid_remote_backend(remote_backend)
 
 
-def requests_response_to_fastapi_response(response) -> Response:
-    excluded_headers = [
-        "content-encoding",
-        "content-length",
-        "transfer-encoding",
-        "connection",
-    ]
-    headers = {
-        name: value
-        for (name, value) in response.raw.headers.items()
-        if name.lower() not in excluded_headers
-    }
-    return Response(
-        content=response.content,
+def _invalid_remote_backend(remote_backend: str) -> HTTPException:
+    return HTTPException(
+        status_code=HTTPStatus.BAD_REQUEST,
+        detail=f"Invalid remote backend {remote_backend}",
+    )
+
+
+def httpx_response_to_fastapi_response(response: httpx.Response) -> Response:
+    # NOTE: the body is decoded while streaming, which is why content-encoding
+    #       is not forwarded
+    streaming_response = StreamingResponse(
+        response.aiter_bytes(),
         status_code=response.status_code,
-        headers=headers,
+        # NOTE: prevent nginx from buffering the streamed response again
+        headers={"X-Accel-Buffering": "no"},
+        background=BackgroundTask(response.aclose),
     )
+    streaming_response.raw_headers.extend(
+        (lower_name, value)
+        for (name, value) in response.headers.raw
+        if (lower_name := name.lower()) not in _EXCLUDED_RESPONSE_HEADERS
+    )
+    return streaming_response
 
 
 async def handle_proxy_request(
@@ -57,38 +101,71 @@ async def handle_proxy_request(
     service_prefix: str,
     proxy_path: str = "",
 ):
-    url = (
-        remote_backend_to_url(remote_backend)
-        + "/"
-        + service_prefix
-        + (f"/{proxy_path}" if proxy_path else "")
+    response = await _send_proxy_request(
+        request=request,
+        remote_backend=remote_backend,
+        service_prefix=service_prefix,
+        proxy_path=proxy_path,
     )
+    # NOTE: don't raise for status, but forward errors
+    return httpx_response_to_fastapi_response(response)
 
-    remote_backend_host = cast(str, urlparse(url).hostname)
 
-    headers = dict(request.headers) | {"Host": remote_backend_host}
+async def _send_proxy_request(
+    request: Request,
+    remote_backend: str,
+    service_prefix: str,
+    proxy_path: str = "",
+) -> httpx.Response:
+    try:
+        service_url = _SERVICE_URLS[service_prefix][remote_backend]
+    except KeyError:
+        raise _invalid_remote_backend(remote_backend)
 
-    proxy_kwargs = {
+    url = f"{service_url}/{proxy_path}" if proxy_path else service_url
+
+    remote_backend_host = _BACKEND_HOSTS[remote_backend]
+
+    headers = request.headers.mutablecopy()
+    headers["host"] = remote_backend_host
+
+    has_body = "content-length" in headers or "transfer-encoding" in headers
+
+    proxy_kwargs: dict[str, Any] = {
         "url": url,
         "params": dict(request.query_params),
-        "headers": headers,
-        "data": await request.body(),
-        "allow_redirects": False,
+        "headers": headers.raw,
+        # NOTE: pipe the body through instead of reading it into memory first
+        "content": request.stream() if has_body else None,
     }
 
     logger.info(f"Requested {request.url}")
-    logger.info(str(proxy_kwargs))
+    logger.debug("Proxy request arguments: %s", proxy_kwargs)
     logger.info(f"Proxying to {proxy_kwargs['url']}")
-    response = getattr(requests, request.method.lower())(**proxy_kwargs)
-    logger.info(f"Got status {response.status_code} and size {len(response.content)}")
-    logger.info(response.content.decode()[:500])
-    # NOTE: don't raise for status, but forward errors
-    return requests_response_to_fastapi_response(response)
+    try:
+        response = await client().send(
+            client().build_request(
+                request.method, timeout=_PROXY_TIMEOUT, **proxy_kwargs
+            ),
+            stream=True,
+            follow_redirects=False,
+        )
+    except httpx.TimeoutException as e:
+        logger.warning(f"Timeout when proxying to {proxy_kwargs['url']}: {e!r}")
+        raise HTTPException(status_code=HTTPStatus.GATEWAY_TIMEOUT)
+    except httpx.TransportError as e:
+        logger.warning(f"Failed to proxy to {proxy_kwargs['url']}: {e!r}")
+        raise HTTPException(status_code=HTTPStatus.BAD_GATEWAY)
+    logger.info(f"Got status {response.status_code}")
+    return response
 
 
 def generate_reverse_proxy(
     service_prefix: str,
 ):
+    # NOTE: the urls are filled in on startup
+    _SERVICE_URLS[service_prefix] = {}
+
     async def do_handle_proxy_request(
         request: Request,
         remote_backend: str,
@@ -119,8 +196,29 @@ def generate_reverse_proxy(
 async def execute_process(
     request: Request, remote_backend: str, process: str
 ) -> Response:
-    logger.info("Deploying process {process}")
-    # we always need to deploy the process in order to get its ID
+    # NOTE: the body is read here so that it can be sent again in case the
+    #       cached deployment is gone and the process needs to be redeployed
+    await request.body()
+
+    # NOTE: deployments are done on behalf of the user, so they are cached per user
+    cache_key = (remote_backend, request.headers["x-user-id"], process)
+    if (process_id := _process_id_cache.get(cache_key)) is not None:
+        logger.info(f"Using cached remote process id {process_id}")
+        response = await _send_proxy_request(
+            request=request,
+            remote_backend=remote_backend,
+            service_prefix="processes",
+            proxy_path=f"{process_id}/execution",
+        )
+        if response.status_code not in (HTTPStatus.NOT_FOUND, HTTPStatus.GONE):
+            return httpx_response_to_fastapi_response(response)
+
+        logger.info(f"Remote process {process_id} is gone, redeploying")
+        await response.aclose()
+        _process_id_cache.pop(cache_key)
+
+    logger.info(f"Deploying process {process}")
+    # we need to deploy the process in order to get its ID
     process_location = await deploy_process(
         request=request,
         remote_backend=remote_backend,
@@ -132,6 +230,7 @@ async def execute_process(
     process_id = process_location.split("/")[-1]
 
     logger.info(f"Extracted remote process id {process_id}")
+    _process_id_cache.set(cache_key, process_id)
 
     return await handle_proxy_request(
         request=request,
@@ -144,35 +243,40 @@ async def execute_process(
 async def deploy_process(request: Request, remote_backend: str, process: str) -> str:
     cwl_link = await _fetch_cwl_link_from_catalog(process)
 
-    async with httpx.AsyncClient() as client:
-        url = remote_backend_to_url(remote_backend) + "/processes"
-        logger.info(f"Deploying process at {url}")
-        deploy_response = await client.post(
-            url,
-            # NOTE: only forward auth here
-            headers={"X-User-Id": request.headers["x-user-id"]},
-            json={
-                "inputs": {
-                    "applicationPackage": {
-                        "href": cwl_link,
-                        "type": "application/cwl",
-                    }
+    url = remote_backend_to_url(remote_backend) + "/processes"
+    logger.info(f"Deploying process at {url}")
+    deploy_response = await client().post(
+        url,
+        # NOTE: only forward auth here
+        headers={"X-User-Id": request.headers["x-user-id"]},
+        json={
+            "inputs": {
+                "applicationPackage": {
+                    "href": cwl_link,
+                    "type": "application/cwl",
                 }
-            },
+            }
+        },
+    )
+    # NOTE: only decode the response body if it's actually logged
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Process deploy response: %s", deploy_response.content.decode()[:1000]
         )
-    logger.info(f"Process deploy response: {deploy_response.content.decode()[:1000]}")
     deploy_response.raise_for_status()
     return deploy_response.headers["Location"]
 
 
 async def _do_download(url, **kwargs):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, **kwargs)
-        response.raise_for_status()
+    response = await client().get(url, **kwargs)
+    response.raise_for_status()
     return response
 
 
 async def _fetch_cwl_link_from_catalog(process: str) -> str:
+    if (cached_link := _cwl_link_cache.get(process)) is not None:
+        return cached_link
+
     logger.info(f"Fetching catalog from {config.RESOURCE_CATALOG_METADATA_URL}")
     catalog_response = await _do_download(
         f"{config.RESOURCE_CATALOG_METADATA_URL}/{process}",
@@ -181,7 +285,14 @@ async def _fetch_cwl_link_from_catalog(process: str) -> str:
     (link,) = [
         link for link in catalog_response.json()["links"] if link["rel"] == "manifest"
     ]
-    return link['href']
+    _cwl_link_cache.set(process, link["href"])
+    return link["href"]
+
+
+def clear_caches() -> None:
+    _cwl_link_cache.clear()
+    _application_cache.clear()
+    _process_id_cache.clear()
 
 
 generate_reverse_proxy(service_prefix="processes")
@@ -190,7 +301,14 @@ generate_reverse_proxy(service_prefix="jobs")
 
 @app.get("/applications/{application}")
 async def get_application(application: str):
-    cwl_link = await _fetch_cwl_link_from_catalog(application)
-    logger.info(f"Fetching cwl from {cwl_link}")
-    cwl_response = await _do_download(cwl_link)
-    return JSONResponse(yaml.safe_load(cwl_response.content))
+    if (content := _application_cache.get(application)) is None:
+        cwl_link = await _fetch_cwl_link_from_catalog(application)
+        logger.info(f"Fetching cwl from {cwl_link}")
+        cwl_response = await _do_download(cwl_link)
+        content = orjson.dumps(
+            yaml.load(cwl_response.content, Loader=_YamlLoader),
+            # NOTE: yaml allows e.g. integer keys, which are converted like in json
+            option=orjson.OPT_NON_STR_KEYS,
+        )
+        _application_cache.set(application, content)
+    return Response(content=content, media_type="application/json")
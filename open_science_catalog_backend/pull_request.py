@@ -1,19 +1,45 @@
+import asyncio
+import base64
 import dataclasses
 import datetime
 from enum import Enum
+from http import HTTPStatus
 import logging
-import json
 from pathlib import PurePath
+import secrets
+import time
 import urllib.parse
 import typing
 
-import github
-import github.Repository
+import httpx
+import orjson
 
 from open_science_catalog_backend import config
+from open_science_catalog_backend.http_client import client
+from open_science_catalog_backend.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+GITHUB_API_URL = "https://api.github.com"
+
+_PULL_REQUESTS_QUERY = """
+query($owner: String!, $name: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(
+      first: 100,
+      after: $cursor,
+      orderBy: {field: CREATED_AT, direction: DESC}
+    ) {
+      pageInfo { endCursor hasNextPage }
+      nodes { body url createdAt state }
+    }
+  }
+}
+"""
+
+# NOTE: the main branch only moves on merges, so a short ttl is sufficient
+_main_branch_sha_cache: TTLCache[str, str] = TTLCache(ttl=30)
+
 
 class ChangeType(str, Enum):
     add = "Add"
@@ -27,19 +53,21 @@ class PullRequestState(str, Enum):
     rejected = "Rejected"
 
     @classmethod
-    def from_pull_request(cls, pr):
-        if pr.state == "open":
+    def from_pull_request(cls, pr: dict):
+        """Map the state of a pull request node of the github graphql api"""
+        if pr["state"] == "OPEN":
             return cls.pending
-        elif pr.merged_at is not None:
-            # NOTE: the `merged` property has to be fetched from the server,
-            #       so we use `merged_at`.
+        elif pr["state"] == "MERGED":
             return cls.merged
         else:
             return cls.rejected
 
 
-def _repo() -> github.Repository.Repository:
-    return github.Github(config.GITHUB_TOKEN).get_repo(config.GITHUB_REPO_ID)
+def _github_headers() -> dict[str, str]:
+    return {
+        "Accept": "application/vnd.github+json",
+        "Authorization": f"Bearer {config.GITHUB_TOKEN}",
+    }
 
 
 @dataclasses.dataclass(frozen=True)
@@ -54,62 +82,105 @@ class PullRequestBody:
     data_owner: bool
 
     def serialize(self) -> str:
-        d = {
-            k: v
-            for k, v in dataclasses.asdict(self).items()
-            if k not in ("url", "created_at", "state")
-        }
-        return json.dumps(d)
+        return orjson.dumps(
+            {name: getattr(self, name) for name in _SERIALIZED_FIELDS}
+        ).decode()
 
     @classmethod
     def deserialize(
         cls,
-        data: str,
+        data: typing.Optional[str],
         url: str,
         state: PullRequestState,
         created_at: datetime.datetime,
     ) -> "PullRequestBody":
+        # NOTE: most manually created PRs are plain text, so reject them
+        #       without the cost of a failed parse
+        if not data or data[0] != "{":
+            raise cls.DeserializeError()
+
         try:
             return cls(
-                **json.loads(data),
+                **orjson.loads(data),
                 url=url,
                 state=state,
                 created_at=created_at,
             )
-        except (json.JSONDecodeError, TypeError) as e:
+        except (orjson.JSONDecodeError, TypeError) as e:
             raise cls.DeserializeError() from e
 
     class DeserializeError(Exception):
         pass
 
 
-def pull_requests() -> typing.Iterable[PullRequestBody]:
-    for pr in _repo().get_pulls(state="all"):
-        try:
-            yield PullRequestBody.deserialize(
-                pr.body,
-                url=pr.html_url,
-                state=PullRequestState.from_pull_request(pr),
-                created_at=pr.created_at,
-            )
-        except PullRequestBody.DeserializeError:
-            # probably manually created PR
-            logger.info("Found incompatible PR, ignoring..", exc_info=True)
+_SERIALIZED_FIELDS = tuple(
+    field.name
+    for field in dataclasses.fields(PullRequestBody)
+    if field.name not in ("url", "created_at", "state")
+)
 
 
-# NOTE: this is currently unused and should be deleted
-def files_in_directory(directory: str) -> typing.List[str]:
-    logger.info(f"Fetching tree for {directory}")
+async def pull_requests() -> typing.AsyncIterator[PullRequestBody]:
+    # NOTE: the graphql api returns all required fields of 100 PRs per call,
+    #       whereas the REST api needs more and smaller requests
+    owner, name = config.GITHUB_REPO_ID.split("/")
+    next_page = asyncio.ensure_future(_pull_requests_page(owner, name, cursor=None))
+
     try:
-        git_tree = _repo().get_git_tree(f"{config.GITHUB_MAIN_BRANCH}:{directory}")
-    except github.UnknownObjectException:
-        logger.info(f"Didn't find a git tree for {directory}")
-        return []
-    else:
-        return [PurePath(node.path).name for node in git_tree.tree]
+        while True:
+            page = await next_page
+            has_next_page = page["pageInfo"]["hasNextPage"]
+            if has_next_page:
+                # NOTE: the cursor only allows fetching pages in order, but the
+                #       next page can already be fetched while this one is processed
+                next_page = asyncio.ensure_future(
+                    _pull_requests_page(
+                        owner, name, cursor=page["pageInfo"]["endCursor"]
+                    )
+                )
+
+            for pr in page["nodes"]:
+                try:
+                    yield PullRequestBody.deserialize(
+                        pr["body"],
+                        url=pr["url"],
+                        state=PullRequestState.from_pull_request(pr),
+                        created_at=datetime.datetime.strptime(
+                            pr["createdAt"], "%Y-%m-%dT%H:%M:%SZ"
+                        ),
+                    )
+                except PullRequestBody.DeserializeError:
+                    # probably manually created PR
+                    logger.info("Found incompatible PR, ignoring..", exc_info=True)
+
+            if not has_next_page:
+                return
+    finally:
+        next_page.cancel()
+
+
+async def _pull_requests_page(
+    owner: str,
+    name: str,
+    cursor: typing.Optional[str],
+) -> dict:
+    response = await client().post(
+        f"{GITHUB_API_URL}/graphql",
+        headers=_github_headers(),
+        json={
+            "query": _PULL_REQUESTS_QUERY,
+            "variables": {"owner": owner, "name": name, "cursor": cursor},
+        },
+    )
+    response.raise_for_status()
+    payload = response.json()
+    if errors := payload.get("errors"):
+        raise RuntimeError(f"Failed to query pull requests: {errors}")
+
+    return payload["data"]["repository"]["pullRequests"]
 
 
-def create_pull_request(
+async def create_pull_request(
     branch_base_name: str,
     pr_title: str,
     pr_body: str,
@@ -121,89 +192,118 @@ def create_pull_request(
     logger.info(f"File to create: {file_to_create[0] if file_to_create else None}")
     logger.info(f"File to delete: {file_to_delete}")
 
-    repo = _repo()
-
-    branch_name = _create_branch(repo, branch_base_name=branch_base_name)
+    # NOTE: the branch and the previous file versions must be based on the
+    #       same commit, otherwise github rejects the file changes
+    base_sha = await _main_branch_sha()
+    branch_name = await _create_branch(
+        branch_base_name=branch_base_name, base_sha=base_sha
+    )
 
     if file_to_create:
-        repo.update_file(
-            path=file_to_create[0],
-            message=f"Add {file_to_create[0]} for pull request submission",
-            content=file_to_create[1],
-            sha=_previous_version_sha(repo, path=file_to_create[0]),
-            branch=branch_name,
+        path, content = file_to_create
+        previous_sha = await _previous_version_sha(path=path, base_sha=base_sha)
+        await _github_request(
+            "PUT",
+            f"/contents/{urllib.parse.quote(path)}",
+            json={
+                "message": f"Add {path} for pull request submission",
+                "content": base64.b64encode(content).decode(),
+                "branch": branch_name,
+                # NOTE: github requires the sha only when replacing a file
+                **({"sha": previous_sha} if previous_sha else {}),
+            },
         )
 
     if file_to_delete:
-        repo.delete_file(
-            path=file_to_delete,
-            message=f"Delete {file_to_delete} for pull request submission",
-            sha=_previous_version_sha(repo, path=file_to_delete),
-            branch=branch_name,
+        await _github_request(
+            "DELETE",
+            f"/contents/{urllib.parse.quote(file_to_delete)}",
+            json={
+                "message": f"Delete {file_to_delete} for pull request submission",
+                "sha": await _previous_version_sha(
+                    path=file_to_delete, base_sha=base_sha
+                ),
+                "branch": branch_name,
+            },
         )
 
-    pr = repo.create_pull(
-        title=pr_title,
-        body=pr_body,
-        head=branch_name,
-        base=config.GITHUB_MAIN_BRANCH,
-        maintainer_can_modify=True,
+    pr_response = await _github_request(
+        "POST",
+        "/pulls",
+        json={
+            "title": pr_title,
+            "body": pr_body,
+            "head": branch_name,
+            "base": config.GITHUB_MAIN_BRANCH,
+            "maintainer_can_modify": True,
+        },
     )
     if labels:
-        pr.set_labels(*labels)
+        await _github_request(
+            "PUT",
+            f"/issues/{pr_response.json()['number']}/labels",
+            json={"labels": list(labels)},
+        )
 
     logger.info("Pull request successfully created")
 
 
-def _create_branch(
-    repo: github.Repository.Repository,
-    branch_base_name: str,
-    postfix: int = 1,
-) -> str:
-    main_branch = repo.get_branch(config.GITHUB_MAIN_BRANCH)
-    branch_name = branch_base_name + ("" if postfix == 1 else f"-{postfix}")
+async def _github_request(method: str, path: str, **kwargs) -> httpx.Response:
+    """Send a request to the github REST api of the configured repository"""
+    response = await client().request(
+        method,
+        f"{GITHUB_API_URL}/repos/{config.GITHUB_REPO_ID}{path}",
+        headers=_github_headers(),
+        **kwargs,
+    )
+    response.raise_for_status()
+    return response
+
+
+async def _create_branch(branch_base_name: str, base_sha: str) -> str:
+    # NOTE: the suffix makes collisions with existing branches practically
+    #       impossible, so there's no need to probe for a free name
+    branch_name = (
+        f"{branch_base_name}-{int(time.time() * 1000):x}-{secrets.token_hex(3)}"
+    )
     logger.info(f"Creating branch with {branch_name}")
-    try:
-        repo.create_git_ref(
-            ref=f"refs/heads/{branch_name}",
-            sha=main_branch.commit.sha,
+    await _github_request(
+        "POST",
+        "/git/refs",
+        json={
+            "ref": f"refs/heads/{branch_name}",
+            "sha": base_sha,
+        },
+    )
+    return branch_name
+
+
+async def _main_branch_sha() -> str:
+    if (sha := _main_branch_sha_cache.get(config.GITHUB_MAIN_BRANCH)) is None:
+        response = await _github_request(
+            "GET", f"/git/ref/heads/{config.GITHUB_MAIN_BRANCH}"
         )
-        return branch_name
-    except github.GithubException as e:
-        if e.status == 422:
-            # we assume that 422 unprocessable entity means branch exists
-
-            if postfix > 15:  # safety
-                raise
-
-            return _create_branch(
-                repo=repo,
-                branch_base_name=branch_base_name,
-                postfix=postfix + 1,
-            )
-        else:
-            raise
+        sha = typing.cast(str, response.json()["object"]["sha"])
+        _main_branch_sha_cache.set(config.GITHUB_MAIN_BRANCH, sha)
+    return sha
 
 
-def _previous_version_sha(
-    repo: github.Repository.Repository,
-    path: str,
-) -> str:
+async def _previous_version_sha(path: str, base_sha: str) -> str:
     pure_path = PurePath(path)
-    encoded_tree_ref = urllib.parse.urlencode(
-        {"": f"{config.GITHUB_MAIN_BRANCH}:{pure_path.parent}"}
-    )[1:]
+    encoded_tree_ref = urllib.parse.quote(f"{base_sha}:{pure_path.parent}", safe="")
     try:
-        parent_tree = repo.get_git_tree(encoded_tree_ref, recursive=False)
-    except github.UnknownObjectException:
-        # parent doesn't exist, so this is a new file
-        return ""
+        response = await _github_request("GET", f"/git/trees/{encoded_tree_ref}")
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == HTTPStatus.NOT_FOUND:
+            # parent doesn't exist, so this is a new file
+            return ""
+        raise
 
     return next(
         (
-            tree_elem.sha
-            for tree_elem in parent_tree.tree
-            if tree_elem.path == pure_path.name
+            tree_elem["sha"]
+            for tree_elem in response.json()["tree"]
+            if tree_elem["path"] == pure_path.name
         ),
         "",  # this submission is a new file, that's fine
     )
@@ -6,4 +6,6 @@ from open_science_catalog_backend import app
 
 @pytest.fixture
 def client():
-    return TestClient(app)
+    # NOTE: entering the context runs the startup/shutdown handlers
+    with TestClient(app) as test_client:
+        yield test_client
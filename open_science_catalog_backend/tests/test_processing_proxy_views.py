@@ -1,8 +1,12 @@
 from http import HTTPStatus
+import json
 from unittest import mock
 
+import httpx
 import pytest
 
+from open_science_catalog_backend.processing_proxy_views import clear_caches
+
 
 @pytest.fixture(autouse=True)
 def mock_remote_backend_config():
@@ -22,9 +26,14 @@ def mock_catalog_url():
         yield
 
 
+@pytest.fixture(autouse=True)
+def empty_caches():
+    clear_caches()
+
+
 @pytest.fixture()
 def mock_catalog_response_found(respx_mock):
-    respx_mock.get("https://catalog.test").respond(
+    return respx_mock.get("https://catalog.test").respond(
         json={
             "id": "python-sleeper",
             "type": "Feature",
@@ -50,7 +59,7 @@ def mock_catalog_response_found(respx_mock):
 
 @pytest.fixture()
 def mock_cwl_server(respx_mock):
-    respx_mock.get("https://cwl-server.test").respond(
+    return respx_mock.get("https://cwl-server.test").respond(
         content="""#!/usr/bin/env cwl-runner
 $graph:
 
@@ -82,7 +91,7 @@ $graph:
 
 @pytest.fixture()
 def mock_process_deploy(respx_mock):
-    respx_mock.post("https://remote-backend.test/processes").respond(
+    return respx_mock.post("https://remote-backend.test/processes").respond(
         headers={
             "Location": "/osc/wps3/processes/python-sleeper-0_0_2",
         }
@@ -90,40 +99,68 @@ def mock_process_deploy(respx_mock):
 
 
 @pytest.fixture()
-def mock_remote_job_status(requests_mock):
-    return requests_mock.get(
-        "https://remote-backend.test/jobs/foo-bar", json={"jobID": 1}
+def mock_remote_job_status(respx_mock):
+    return respx_mock.get("https://remote-backend.test/jobs/foo-bar").respond(
+        json={"jobID": 1}
     )
 
 
 @pytest.fixture()
-def mock_remote_job_results(requests_mock):
-    return requests_mock.get(
-        "https://remote-backend.test/jobs/foo-bar/results",
+def mock_remote_job_results(respx_mock):
+    return respx_mock.get("https://remote-backend.test/jobs/foo-bar/results").respond(
         content=b"a",
         headers={"Content-Type": "custom/stuff"},
     )
 
 
 @pytest.fixture()
-def mock_remote_process_get_found(requests_mock):
-    return requests_mock.get(
-        "https://remote-backend.test/processes/python-sleeper-0_0_2",
-        json={"remote-process-get-result": 3},
-    )
+def mock_remote_process_get_found(respx_mock):
+    return respx_mock.get(
+        "https://remote-backend.test/processes/python-sleeper-0_0_2"
+    ).respond(json={"remote-process-get-result": 3})
 
 
 @pytest.fixture()
-def mock_remote_process_execute(requests_mock):
-    return requests_mock.post(
-        "https://remote-backend.test/processes/python-sleeper-0_0_2/execution",
-        json={"remote-process-post-result": 5},
-    )
+def mock_remote_process_execute(respx_mock):
+    return respx_mock.post(
+        "https://remote-backend.test/processes/python-sleeper-0_0_2/execution"
+    ).respond(json={"remote-process-post-result": 5})
 
 
 def test_forwarded_request_sets_host_header(client, mock_remote_job_status):
     client.get("/processing/mailuefterl/jobs/foo-bar")
-    assert mock_remote_job_status.last_request.headers["host"] == "remote-backend.test"
+    assert (
+        mock_remote_job_status.calls.last.request.headers["host"]
+        == "remote-backend.test"
+    )
+
+
+def test_proxied_requests_have_no_read_timeout(client, mock_remote_job_status):
+    client.get("/processing/mailuefterl/jobs/foo-bar")
+    timeout = mock_remote_job_status.calls.last.request.extensions["timeout"]
+    assert timeout["read"] is None
+
+
+@pytest.mark.parametrize(
+    "error, status_code",
+    [
+        (httpx.ConnectTimeout("timeout"), HTTPStatus.GATEWAY_TIMEOUT),
+        (httpx.ConnectError("refused"), HTTPStatus.BAD_GATEWAY),
+    ],
+)
+def test_upstream_transport_errors_are_mapped_to_gateway_errors(
+    client, respx_mock, error, status_code
+):
+    respx_mock.get("https://remote-backend.test/jobs/foo-bar").mock(side_effect=error)
+
+    response = client.get("/processing/mailuefterl/jobs/foo-bar")
+
+    assert response.status_code == status_code
+
+
+def test_unknown_remote_backend_is_rejected(client):
+    response = client.get("/processing/unknown/jobs/foo-bar")
+    assert response.status_code == HTTPStatus.BAD_REQUEST
 
 
 def test_job_status_can_be_fetched(client, mock_remote_job_status):
@@ -141,6 +178,12 @@ def test_job_results_can_be_fetched(client, mock_remote_job_results):
     assert response.headers["Content-Type"] == "custom/stuff"
 
 
+def test_proxied_responses_are_not_buffered_by_nginx(client, mock_remote_job_results):
+    response = client.get("/processing/mailuefterl/jobs/foo-bar/results")
+
+    assert response.headers["X-Accel-Buffering"] == "no"
+
+
 def test_execute_process_also_deploys(
     client,
     mock_catalog_response_found,
@@ -155,6 +198,70 @@ def test_execute_process_also_deploys(
     assert response.json()["remote-process-post-result"] == 5
 
 
+def test_execute_process_reuses_deployed_process(
+    client,
+    mock_catalog_response_found,
+    mock_process_deploy,
+    mock_remote_process_execute,
+) -> None:
+    for _ in range(2):
+        response = client.post(
+            "/processing/mailuefterl/processes/python-sleeper/execution",
+            headers={"X-User-ID": "abc"},
+        )
+        assert response.status_code == HTTPStatus.OK
+
+    assert mock_process_deploy.call_count == 1
+    assert mock_remote_process_execute.call_count == 2
+
+
+def test_execute_process_redeploys_if_deployed_process_is_gone(
+    client,
+    mock_catalog_response_found,
+    mock_process_deploy,
+    mock_remote_process_execute,
+) -> None:
+    client.post(
+        "/processing/mailuefterl/processes/python-sleeper/execution",
+        headers={"X-User-ID": "abc"},
+    )
+    mock_remote_process_execute.side_effect = [
+        httpx.Response(status_code=HTTPStatus.NOT_FOUND),
+        httpx.Response(
+            status_code=HTTPStatus.OK, json={"remote-process-post-result": 5}
+        ),
+    ]
+
+    response = client.post(
+        "/processing/mailuefterl/processes/python-sleeper/execution",
+        headers={"X-User-ID": "abc"},
+        json={"inputs": {}},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert mock_process_deploy.call_count == 2
+    assert json.loads(mock_remote_process_execute.calls.last.request.content) == {
+        "inputs": {}
+    }
+
+
+def test_execute_process_forwards_request_body(
+    client,
+    mock_catalog_response_found,
+    mock_process_deploy,
+    mock_remote_process_execute,
+) -> None:
+    client.post(
+        "/processing/mailuefterl/processes/python-sleeper/execution",
+        headers={"X-User-ID": "abc"},
+        json={"inputs": {"min_sleep_seconds": "1"}},
+    )
+    upstream_request = mock_remote_process_execute.calls.last.request
+    assert json.loads(upstream_request.content) == {
+        "inputs": {"min_sleep_seconds": "1"}
+    }
+
+
 def test_get_applications_view_forwards_from_catalog(
     client,
     mock_catalog_response_found,
@@ -163,3 +270,38 @@ def test_get_applications_view_forwards_from_catalog(
     response = client.get("/applications/python-sleeper")
     assert response.status_code == HTTPStatus.OK
     response.json()["$graph"][0]["id"] == "python-sleeper"
+
+
+def test_get_applications_view_converts_non_string_keys(
+    client,
+    mock_catalog_response_found,
+    respx_mock,
+) -> None:
+    respx_mock.get("https://cwl-server.test").respond(content="1: x\n")
+
+    response = client.get("/applications/python-sleeper")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {"1": "x"}
+
+
+def test_get_applications_view_caches_converted_cwl(
+    client,
+    mock_catalog_response_found,
+    mock_cwl_server,
+) -> None:
+    first_response = client.get("/applications/python-sleeper")
+    second_response = client.get("/applications/python-sleeper")
+
+    assert mock_cwl_server.call_count == 1
+    assert first_response.json() == second_response.json()
+
+
+def test_catalog_lookups_are_cached(
+    client,
+    mock_catalog_response_found,
+    mock_cwl_server,
+) -> None:
+    client.get("/applications/python-sleeper")
+    client.get("/applications/python-sleeper")
+    assert mock_catalog_response_found.call_count == 1
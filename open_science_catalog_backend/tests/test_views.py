@@ -1,10 +1,15 @@
+import asyncio
 import datetime
 from http import HTTPStatus
 import json
+import logging
+import threading
 from unittest import mock
 
+import httpx
 import pytest
 
+from open_science_catalog_backend import views
 from open_science_catalog_backend.pull_request import (
     ChangeType,
     PullRequestBody,
@@ -23,6 +28,14 @@ def mock_create_pull_request():
         yield mocker
 
 
+@pytest.fixture()
+def wait_for_pr_creation(client):
+    async def wait():
+        await asyncio.gather(*views._pr_creation_tasks, return_exceptions=True)
+
+    return lambda: client.portal.call(wait)
+
+
 @pytest.fixture()
 def pull_request_body():
     return PullRequestBody(
@@ -39,9 +52,12 @@ def pull_request_body():
 
 @pytest.fixture()
 def mock_pull_requests(pull_request_body):
+    async def pull_requests():
+        yield pull_request_body
+
     with mock.patch(
         "open_science_catalog_backend.views.pull_requests",
-        return_value=[pull_request_body],
+        side_effect=pull_requests,
     ) as mocker:
         yield mocker
 
@@ -55,24 +71,68 @@ def mock_files_in_directory():
         yield mocker
 
 
-def test_post_item_creates_pull_request(client, mock_create_pull_request):
+def test_post_item_creates_pull_request(
+    client, mock_create_pull_request, wait_for_pr_creation
+):
     response = client.post(
         "/item-requests/products/a.json", json={"test": "foo"}, headers=VALID_HEADERS
     )
+    wait_for_pr_creation()
 
     mock_create_pull_request.assert_called_once()
-    assert response.status_code == HTTPStatus.CREATED
+    assert response.status_code == HTTPStatus.ACCEPTED
 
 
-def test_post_item_creates_formats_file(client, mock_create_pull_request):
+def test_post_item_creates_formats_file(
+    client, mock_create_pull_request, wait_for_pr_creation
+):
     client.post(
         "/item-requests/products/a.json", json={"test": "foo"}, headers=VALID_HEADERS
     )
+    wait_for_pr_creation()
 
     mock_create_pull_request.assert_called_once()
     assert b"\n" in mock_create_pull_request.mock_calls[0].kwargs["file_to_create"][1]
 
 
+def test_post_item_responds_before_pull_request_is_created(
+    client, mock_create_pull_request, wait_for_pr_creation
+):
+    release = threading.Event()
+
+    async def create_pull_request(**kwargs):
+        await asyncio.to_thread(release.wait, 5)
+
+    mock_create_pull_request.side_effect = create_pull_request
+
+    response = client.post(
+        "/item-requests/products/a.json", json={"test": "foo"}, headers=VALID_HEADERS
+    )
+    pr_creation_pending = bool(views._pr_creation_tasks)
+    release.set()
+    wait_for_pr_creation()
+
+    assert response.status_code == HTTPStatus.ACCEPTED
+    assert pr_creation_pending
+    mock_create_pull_request.assert_called_once()
+
+
+def test_failed_pull_request_creation_is_logged(
+    client, mock_create_pull_request, wait_for_pr_creation, caplog
+):
+    mock_create_pull_request.side_effect = RuntimeError("github is down")
+
+    with caplog.at_level(logging.ERROR):
+        client.post(
+            "/item-requests/products/a.json",
+            json={"test": "foo"},
+            headers=VALID_HEADERS,
+        )
+        wait_for_pr_creation()
+
+    assert "Failed to create pull request" in caplog.text
+
+
 def test_create_item_without_auth_fails(client):
     response = client.post("/item-requests/products/a.json", json={})
     assert response.status_code == HTTPStatus.UNAUTHORIZED
@@ -104,6 +164,95 @@ def test_get_items_returns_pending_list_for_user(client, mock_pull_requests):
     }
 
 
+def test_get_items_fetches_pull_requests_from_github(client, respx_mock):
+    respx_mock.post("https://api.github.com/graphql").respond(
+        json={
+            "data": {
+                "repository": {
+                    "pullRequests": {
+                        "pageInfo": {"endCursor": "abc", "hasNextPage": False},
+                        "nodes": [
+                            {
+                                "body": '{"filename": "a.json", "item_type": "products", '
+                                '"change_type": "Add", "user": "foo", "data_owner": false}',
+                                "url": "https://github.test/pull/1",
+                                "createdAt": "2000-01-01T00:00:00Z",
+                                "state": "MERGED",
+                            },
+                            {
+                                "body": "Manually created PR",
+                                "url": "https://github.test/pull/2",
+                                "createdAt": "2000-01-01T00:00:00Z",
+                                "state": "OPEN",
+                            },
+                        ],
+                    }
+                }
+            }
+        }
+    )
+    response = client.get("/item-requests", headers=VALID_HEADERS)
+    assert response.json()["items"] == [
+        {
+            "filename": "a.json",
+            "change_type": "Add",
+            "url": "https://github.test/pull/1",
+            "data_owner": False,
+            "state": "Merged",
+            "item_type": "products",
+            "created_at": "2000-01-01T00:00:00",
+        }
+    ]
+
+
+def test_get_items_fetches_all_pages_of_pull_requests(client, respx_mock):
+    def page(filename, has_next_page):
+        return httpx.Response(
+            status_code=HTTPStatus.OK,
+            json={
+                "data": {
+                    "repository": {
+                        "pullRequests": {
+                            "pageInfo": {
+                                "endCursor": filename,
+                                "hasNextPage": has_next_page,
+                            },
+                            "nodes": [
+                                {
+                                    "body": json.dumps(
+                                        {
+                                            "filename": filename,
+                                            "item_type": "products",
+                                            "change_type": "Add",
+                                            "user": "foo",
+                                            "data_owner": False,
+                                        }
+                                    ),
+                                    "url": "https://github.test/pull/1",
+                                    "createdAt": "2000-01-01T00:00:00Z",
+                                    "state": "OPEN",
+                                }
+                            ],
+                        }
+                    }
+                }
+            },
+        )
+
+    graphql = respx_mock.post("https://api.github.com/graphql").mock(
+        side_effect=[page("a.json", True), page("b.json", False)]
+    )
+
+    response = client.get("/item-requests", headers=VALID_HEADERS)
+
+    assert [item["filename"] for item in response.json()["items"]] == [
+        "a.json",
+        "b.json",
+    ]
+    last_query = json.loads(graphql.calls.last.request.content)
+    assert last_query["variables"]["cursor"] == "a.json"
+
+
 def test_put_item_creates_pull_request(client, mock_create_pull_request):
     response = client.put(
         "/item-requests/projects/a", json={"test": "update"}, headers=VALID_HEADERS
@@ -132,6 +281,17 @@ def test_pr_bodies_can_be_deserialized():
     ) == 3
 
 
+@pytest.mark.parametrize("serialized_body", [None, "", "Fix typo", "{", "[]", "{}"])
+def test_incompatible_pr_bodies_are_rejected(serialized_body):
+    with pytest.raises(PullRequestBody.DeserializeError):
+        PullRequestBody.deserialize(
+            serialized_body,
+            url="",
+            state=PullRequestState.pending,
+            created_at=datetime.datetime(2000, 1, 1),
+        )
+
+
 @pytest.mark.parametrize("dynamic_key", ["url", "state", "created_at"])
 def test_pr_body_serializes_without_dynamic_attributes(
     pull_request_body: PullRequestBody,
@@ -140,3 +300,66 @@ def test_pr_body_serializes_without_dynamic_attributes(
     serialized = pull_request_body.serialize()
     raw_data = json.loads(serialized)
     assert dynamic_key not in raw_data
+
+
+def test_post_item_creates_branch_file_and_pull_request_on_github(
+    client, respx_mock, wait_for_pr_creation
+):
+    repo_url = "https://api.github.com/repos/example/example"
+    respx_mock.get(f"{repo_url}/git/ref/heads/main").respond(
+        json={"object": {"sha": "main-sha"}}
+    )
+    create_ref = respx_mock.post(f"{repo_url}/git/refs").respond(status_code=201)
+    get_tree = respx_mock.get(url__startswith=f"{repo_url}/git/trees/").respond(
+        status_code=404
+    )
+    create_file = respx_mock.put(f"{repo_url}/contents/data/products/a.json").respond(
+        status_code=201
+    )
+    create_pull = respx_mock.post(f"{repo_url}/pulls").respond(
+        status_code=201, json={"number": 7}
+    )
+    set_labels = respx_mock.put(f"{repo_url}/issues/7/labels").respond()
+
+    client.post(
+        "/item-requests/products/a.json", json={"test": "foo"}, headers=VALID_HEADERS
+    )
+    wait_for_pr_creation()
+
+    branch_ref = json.loads(create_ref.calls.last.request.content)
+    assert branch_ref["sha"] == "main-sha"
+    file_data = json.loads(create_file.calls.last.request.content)
+    assert "sha" not in file_data
+    assert get_tree.calls.last.request.url.raw_path.endswith(
+        b"/git/trees/main-sha%3Adata%2Fproducts"
+    )
+    assert (
+        file_data["branch"]
+        == json.loads(create_pull.calls.last.request.content)["head"]
+    )
+    assert json.loads(set_labels.calls.last.request.content) == {
+        "labels": ["OSCDataOwner"]
+    }
+
+
+def test_delete_item_quotes_reserved_characters_in_github_path(client, respx_mock):
+    repo_url = "https://api.github.com/repos/example/example"
+    respx_mock.get(f"{repo_url}/git/ref/heads/main").respond(
+        json={"object": {"sha": "main-sha"}}
+    )
+    respx_mock.post(f"{repo_url}/git/refs").respond(status_code=201)
+    respx_mock.get(url__startswith=f"{repo_url}/git/trees/").respond(
+        json={"tree": [{"path": "a#b.json", "sha": "file-sha"}]}
+    )
+    delete_file = respx_mock.delete(url__startswith=f"{repo_url}/contents/").respond()
+    respx_mock.post(f"{repo_url}/pulls").respond(status_code=201, json={"number": 7})
+    respx_mock.put(f"{repo_url}/issues/7/labels").respond()
+
+    client.delete("/item-requests/products/a%23b.json", headers=VALID_HEADERS)
+
+    delete_request = delete_file.calls.last.request
+    assert (
+        delete_request.url.raw_path
+        == b"/repos/example/example/contents/data/products/a%23b.json"
+    )
+    assert json.loads(delete_request.content)["sha"] == "file-sha"
@@ -0,0 +1,39 @@
+import time
+import typing
+
+K = typing.TypeVar("K")
+V = typing.TypeVar("V")
+
+
+class TTLCache(typing.Generic[K, V]):
+    """Small in-memory mapping whose entries expire after `ttl` seconds"""
+
+    def __init__(self, ttl: float, maxsize: int = 1024) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: dict[K, tuple[float, V]] = {}
+
+    def get(self, key: K) -> typing.Optional[V]:
+        try:
+            expiry, value = self._entries[key]
+        except KeyError:
+            return None
+
+        if time.monotonic() >= expiry:
+            del self._entries[key]
+            return None
+
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        # re-insert so that the dict order reflects insertion time
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.maxsize:
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def pop(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 from enum import Enum
 import json
@@ -29,6 +30,10 @@ logger = logging.getLogger(__name__)
 
 PREFIX_IN_REPO = PurePath("data")
 
+# NOTE: references to running PR creations, otherwise the event loop might
+#       garbage collect them before they're done
+_pr_creation_tasks: typing.Set[asyncio.Task] = set()
+
 
 class ItemType(str, Enum):
     projects = "projects"
@@ -63,7 +68,7 @@ def get_data_owner_role(
 
 @app.post(
     "/item-requests/{item_type}/{filename}",
-    status_code=HTTPStatus.CREATED,
+    status_code=HTTPStatus.ACCEPTED,
 )
 async def create_item(
     request: Request,
@@ -80,15 +85,33 @@ async def create_item(
 
     # NOTE: if this file already exists, this will lead to an override
 
-    _create_file_change_pr(
-        item_type=item_type,
-        filename=filename,
-        contents=request_body,
-        change_type=ChangeType.add,
-        user=user,
-        data_owner=data_owner,
+    # NOTE: the PR is created detached from this request, it shows up in the item
+    #       requests as soon as it exists
+    _start_pr_creation(
+        _create_file_change_pr(
+            item_type=item_type,
+            filename=filename,
+            contents=request_body,
+            change_type=ChangeType.add,
+            user=user,
+            data_owner=data_owner,
+        )
     )
-    return Response(status_code=HTTPStatus.CREATED)
+    return Response(status_code=HTTPStatus.ACCEPTED)
+
+
+def _start_pr_creation(pr_creation: typing.Coroutine[typing.Any, typing.Any, None]):
+    # NOTE: this is not a starlette background task, because the http middleware
+    #       keeps the connection busy until those are done
+    task = asyncio.create_task(pr_creation)
+    _pr_creation_tasks.add(task)
+    task.add_done_callback(_pr_creation_done)
+
+
+def _pr_creation_done(task: asyncio.Task) -> None:
+    _pr_creation_tasks.discard(task)
+    if not task.cancelled() and (exc := task.exception()) is not None:
+        logger.error("Failed to create pull request", exc_info=exc)
 
 
 @app.put("/item-requests/{item_type}/{filename}")
@@ -105,7 +128,7 @@ async def put_item(
 
     request_body = await request.json()
 
-    _create_file_change_pr(
+    await _create_file_change_pr(
         item_type=item_type,
         filename=filename,
         contents=request_body,
@@ -116,7 +139,7 @@ async def put_item(
     return Response()
 
 
-def _create_file_change_pr(
+async def _create_file_change_pr(
     item_type: ItemType,
     filename: str,
     change_type: ChangeType,
@@ -150,7 +173,7 @@ def _create_file_change_pr(
         file_to_create = None
         file_to_delete = path_in_repo
 
-    create_pull_request(
+    await create_pull_request(
         branch_base_name=slugify(path_in_repo)[:30],
         pr_title=f"{change_type} {path_in_repo}",
         pr_body=pr_body.serialize(),
@@ -179,7 +202,7 @@ async def get_all_items(user=Depends(get_user)):
     """Get list of IDs of items for a certain user/workspace."""
 
     return ItemsResponse(
-        items=_item_requests(
+        items=await _item_requests(
             user=user,
         ),
     )
@@ -189,14 +212,14 @@ async def get_all_items(user=Depends(get_user)):
 async def get_items_of_type(item_type: ItemType, user=Depends(get_user)):
     """Get list of IDs of items for a certain user/workspace."""
     return ItemsResponse(
-        items=_item_requests(
+        items=await _item_requests(
             user=user,
             item_type=item_type,
         ),
     )
 
 
-def _item_requests(
+async def _item_requests(
     user: str,
     item_type: typing.Optional[ItemType] = None,
 ) -> typing.List[ResponseItem]:
@@ -210,7 +233,7 @@ def _item_requests(
             item_type=ItemType(pr_body.item_type),
             created_at=typing.cast(datetime.datetime, pr_body.created_at).isoformat(),
         )
-        for pr_body in pull_requests()
+        async for pr_body in pull_requests()
         if (item_type is None or pr_body.item_type == item_type.value)
         and pr_body.user == user
     ]
@@ -227,7 +250,7 @@ async def delete_item(
 
     logger.info(f"Creating PR to delete item {filename}")
 
-    _create_file_change_pr(
+    await _create_file_change_pr(
         item_type=item_type,
         filename=filename,
         change_type=ChangeType.delete,